@@ -0,0 +1,442 @@
+import asyncio
+import os
+import wave
+import numpy as np
+from scipy.io import wavfile
+
+# Live acquisition of SpikerBox-style sample streams.
+#
+# Framing (Backyard Brains SpikerBox): every frame holds one sample per channel,
+# 2 bytes per sample, 7 payload bits per byte. The first byte of a frame has its
+# most significant bit set, every other byte has it cleared, so the reader can
+# resynchronise after lost bytes. The SpikerBox sends 10-bit samples; the replay
+# server below uses 14 bits, so replayed int16 recordings lose their 2 lowest
+# bits (the round trip is lossy, off by up to 3 counts).
+#
+# Data flow: stream -> FrameDecoder -> RingBuffer -> one task per consumer.
+# Everything runs on one event loop with a single writer, so the ring buffer
+# needs no locks: every reader just keeps its own position.
+
+FRAME_FLAG = 0x80
+
+
+class FrameDecoder:
+    def __init__(self, n_channels=1, bits=10):
+        self.n_channels = n_channels
+        self.bits = bits
+        self.frame_len = 2 * n_channels
+        self._pending = b""
+        # accounting of what could not be decoded
+        self.frames = 0
+        self.dropped_bytes = 0
+        self.resyncs = 0
+
+    def decode(self, chunk):
+        """
+        Decode a chunk of raw bytes into int16 samples.
+
+        Bytes that do not belong to a complete, well-formed frame are dropped and
+        counted; an incomplete frame at the end is kept for the next chunk.
+
+        :return: int16 array (n_frames, n_channels)
+        """
+        buf = np.frombuffer(self._pending + bytes(chunk), dtype=np.uint8)
+        L = self.frame_len
+        flagged = (buf & FRAME_FLAG) != 0
+        starts = np.flatnonzero(flagged)
+
+        # a frame is valid when exactly one flagged byte (its first) falls inside it
+        n_flags = np.concatenate(([0], np.cumsum(flagged)))
+        complete = starts + L <= len(buf)
+        valid = starts[complete]
+        valid = valid[n_flags[valid + L] - n_flags[valid] == 1]
+
+        # keep a trailing frame that may still be completed by the next chunk
+        tail = len(buf)
+        if len(starts) and not complete[-1]:
+            tail = starts[-1]
+        self._pending = buf[tail:].tobytes()
+
+        # every byte before the tail that is not part of a valid frame is lost
+        gaps = np.concatenate((valid, [tail])) - np.concatenate(([0], valid + L))
+        self.dropped_bytes += int(np.sum(gaps))
+        self.resyncs += int(np.count_nonzero(gaps))
+        self.frames += len(valid)
+
+        idx = valid[:, None] + 2 * np.arange(self.n_channels)
+        code = ((buf[idx].astype(np.int32) & 0x7F) << 7) | (buf[idx + 1] & 0x7F)
+        samples = (code - (1 << (self.bits - 1))) << (16 - self.bits)
+        return np.clip(samples, -32768, 32767).astype(np.int16)
+
+
+def encode_frames(samples, bits=14):
+    """
+    Encode int16 samples (n_frames,) or (n_frames, n_channels) into frame bytes.
+    """
+    samples = np.asarray(samples)
+    if samples.ndim == 1:
+        samples = samples[:, None]
+    code = (samples.astype(np.int32) >> (16 - bits)) + (1 << (bits - 1))
+    out = np.empty(samples.shape + (2,), dtype=np.uint8)
+    out[..., 0] = (code >> 7) & 0x7F
+    out[..., 1] = code & 0x7F
+    out[:, 0, 0] |= FRAME_FLAG
+    return out.tobytes()
+
+
+class RingBuffer:
+    def __init__(self, capacity, n_channels=1, dtype=np.int16):
+        self.capacity = capacity
+        self.data = np.zeros((capacity, n_channels), dtype=dtype)
+        # total number of frames ever written; positions are absolute frame counts
+        self.written = 0
+        self.closed = False
+        self._new_data = asyncio.Event()
+        self._space = asyncio.Event()
+        self._lossless = []
+
+    def reader(self, lossless=False):
+        """
+        Create a reader starting at the current write position.
+
+        The writer waits for lossless readers (backpressure); other readers that
+        fall more than `capacity` frames behind skip ahead and count the drop.
+        """
+        reader = Reader(self, self.written)
+        if lossless:
+            self._lossless.append(reader)
+        return reader
+
+    def release(self, reader):
+        """
+        Stop waiting for a reader (its consumer has finished or failed).
+        """
+        if reader in self._lossless:
+            self._lossless.remove(reader)
+        self._space.set()
+
+    def free_space(self):
+        if not self._lossless:
+            return self.capacity
+        return self.capacity - (self.written - min(r.position for r in self._lossless))
+
+    async def write(self, frames):
+        """
+        Copy a block of frames into the buffer (no allocation), waiting for
+        lossless readers when the buffer is full.
+        """
+        if not self._lossless:
+            self._copy(frames)
+            return
+        # lossless readers must see every frame, so write in pieces that fit
+        for i in range(0, len(frames), self.capacity):
+            piece = frames[i:i + self.capacity]
+            while self.free_space() < len(piece):
+                self._space.clear()
+                await self._space.wait()
+            self._copy(piece)
+
+    def _copy(self, frames):
+        n = len(frames)
+        if n > self.capacity:
+            frames = frames[-self.capacity:]
+            self.written += n - self.capacity
+            n = self.capacity
+        start = self.written % self.capacity
+        first = min(n, self.capacity - start)
+        self.data[start:start + first] = frames[:first]
+        self.data[:n - first] = frames[first:]
+        self.written += n
+        # wake every waiting reader
+        self._new_data.set()
+        self._new_data.clear()
+
+    def close(self):
+        """
+        Mark the end of the stream; readers return what is left, then nothing.
+        """
+        self.closed = True
+        self._new_data.set()
+
+    def segments(self, start, stop):
+        """
+        Views (at most two) of the frames with absolute positions [start, stop).
+        """
+        i, j = start % self.capacity, stop % self.capacity
+        if stop - start == 0:
+            return []
+        if i < j:
+            return [self.data[i:j]]
+        return [self.data[i:], self.data[:j]] if j else [self.data[i:]]
+
+    def latest(self, out):
+        """
+        Copy the newest len(out) frames into a preallocated array.
+        """
+        n = min(len(out), self.written, self.capacity)
+        pos = len(out) - n
+        for seg in self.segments(self.written - n, self.written):
+            out[pos:pos + len(seg)] = seg
+            pos += len(seg)
+        return out
+
+
+class Reader:
+    def __init__(self, ring, position):
+        self.ring = ring
+        self.position = position
+        self.dropped = 0
+
+    def available(self):
+        return self.ring.written - self.position
+
+    async def read(self):
+        """
+        Wait for new frames and return them as views into the ring buffer.
+
+        The views are valid until the next await. Returns an empty list once the
+        ring buffer is closed and everything has been read.
+        """
+        while self.available() == 0:
+            if self.ring.closed:
+                return []
+            await self.ring._new_data.wait()
+        ring = self.ring
+        if self.available() > ring.capacity:
+            self.dropped += self.available() - ring.capacity
+            self.position = ring.written - ring.capacity
+        segments = ring.segments(self.position, ring.written)
+        self.position = ring.written
+        ring._space.set()
+        return segments
+
+
+class Recorder:
+    """
+    Write the stream to a 16-bit WAV file as it arrives.
+    """
+    def __init__(self, path, samplerate, n_channels=1):
+        self.path = path
+        self.samplerate = samplerate
+        self.n_channels = n_channels
+        self._wav = None
+
+    def start(self):
+        self._wav = wave.open(self.path, "wb")
+        self._wav.setnchannels(self.n_channels)
+        self._wav.setsampwidth(2)
+        self._wav.setframerate(self.samplerate)
+
+    def process(self, block):
+        self._wav.writeframesraw(np.ascontiguousarray(block))
+
+    def stop(self):
+        if self._wav is not None:
+            self._wav.close()
+            self._wav = None
+
+
+class LiveRMS:
+    """
+    RMS of the newest window, updated on every block.
+    """
+    def __init__(self, samplerate, window_ms=100, channel=0, callback=None):
+        self.window_size = int(window_ms * samplerate / 1000)
+        self.channel = channel
+        self.callback = callback
+        self.value = 0.0
+        self._window = np.zeros(self.window_size, dtype=np.float64)
+        self._filled = 0
+
+    def start(self):
+        pass
+
+    def process(self, block):
+        # slide the preallocated window by the new samples
+        W = self.window_size
+        x = block[-W:, self.channel]
+        n = len(x)
+        if n < W:
+            self._window[:W - n] = self._window[n:]
+        self._window[W - n:] = x
+        self._filled = min(self._filled + n, W)
+        w = self._window[-self._filled:]
+        self.value = float(np.sqrt(np.dot(w, w) / self._filled))
+        if self.callback is not None:
+            self.callback(self.value)
+
+    def stop(self):
+        pass
+
+
+class LivePlot:
+    """
+    Redraw the newest `seconds` of signal at most `fps` times per second.
+    """
+    def __init__(self, ring, samplerate, seconds=5, fps=10, channel=0):
+        self.ring = ring
+        self.samplerate = samplerate
+        self.channel = channel
+        self.interval = 1 / fps
+        self._frames = np.zeros((int(seconds * samplerate), ring.data.shape[1]), dtype=ring.data.dtype)
+        self._last = 0.0
+        self._line = None
+
+    def start(self):
+        import matplotlib.pyplot as plt
+        self._plt = plt
+        fig, ax = plt.subplots(figsize=(10, 4))
+        t = np.arange(len(self._frames)) / self.samplerate
+        self._line, = ax.plot(t, self._frames[:, self.channel])
+        ax.set_ylim(-32768, 32767)
+        ax.set_xlabel('Time (s)')
+        ax.set_ylabel('Amplitude')
+        plt.show(block=False)
+
+    def process(self, block):
+        now = asyncio.get_running_loop().time()
+        if now - self._last < self.interval:
+            return
+        self._last = now
+        self.ring.latest(self._frames)
+        self._line.set_ydata(self._frames[:, self.channel])
+        self._plt.pause(0.001)
+
+    def stop(self):
+        pass
+
+
+class AcquisitionClient:
+    def __init__(self, samplerate, n_channels=1, bits=10, buffer_sec=10, chunk_size=4096):
+        self.samplerate = samplerate
+        self.decoder = FrameDecoder(n_channels, bits)
+        self.ring = RingBuffer(int(buffer_sec * samplerate), n_channels)
+        self.chunk_size = chunk_size
+        self.bytes_received = 0
+        self._consumers = []
+
+    def add_consumer(self, consumer, lossless=False):
+        """
+        Register a consumer with start(), process(block) and stop() methods.
+
+        Lossless consumers (e.g. the Recorder) slow the stream down instead of
+        losing frames; the others drop frames when they fall behind.
+        """
+        self._consumers.append((consumer, self.ring.reader(lossless)))
+
+    async def _consume(self, consumer, reader):
+        try:
+            consumer.start()
+            while True:
+                segments = await reader.read()
+                if not segments:
+                    break
+                for block in segments:
+                    consumer.process(block)
+        finally:
+            # a finished or failed consumer must not keep blocking the writer
+            self.ring.release(reader)
+            consumer.stop()
+
+    async def run(self, stream):
+        """
+        Read from an asyncio StreamReader until it closes or a consumer fails;
+        the consumer's exception is raised here.
+        """
+        tasks = [asyncio.create_task(self._consume(c, r)) for c, r in self._consumers]
+        try:
+            while True:
+                # consumers only finish early when they fail
+                if any(task.done() for task in tasks):
+                    break
+                chunk = await stream.read(self.chunk_size)
+                if not chunk:
+                    break
+                self.bytes_received += len(chunk)
+                frames = self.decoder.decode(chunk)
+                if len(frames):
+                    await self.ring.write(frames)
+        finally:
+            self.ring.close()
+            await asyncio.gather(*tasks)
+
+    async def run_tcp(self, host, port):
+        stream, writer = await asyncio.open_connection(host, port)
+        try:
+            await self.run(stream)
+        finally:
+            writer.close()
+
+    async def run_serial(self, port, baudrate=230400):
+        try:
+            import serial_asyncio
+        except ImportError:
+            raise ImportError("Reading from a serial port needs pyserial-asyncio "
+                              "(pip install pyserial-asyncio).")
+        stream, writer = await serial_asyncio.open_serial_connection(url=port, baudrate=baudrate)
+        try:
+            await self.run(stream)
+        finally:
+            writer.close()
+
+    def stats(self):
+        return {
+            "bytes_received": self.bytes_received,
+            "frames": self.decoder.frames,
+            "dropped_bytes": self.decoder.dropped_bytes,
+            "resyncs": self.decoder.resyncs,
+            "consumer_dropped_frames": {type(c).__name__: r.dropped for c, r in self._consumers},
+        }
+
+
+async def serve_wav(wav_path, host="127.0.0.1", port=0, speed=1.0, block_ms=20, bits=14):
+    """
+    Replay server: stream a WAV file to every client in SpikerBox framing.
+
+    :param speed: 1.0 for real time, 10.0 for ten times faster, None for as fast as possible
+    :return: asyncio Server (use server.sockets[0].getsockname() to get the port)
+    """
+    samplerate, data = wavfile.read(wav_path)
+    payload = encode_frames(data, bits=bits)
+    frame_len = len(payload) // len(data)
+    block = max(1, int(block_ms * samplerate / 1000))
+
+    async def handle(reader, writer):
+        loop = asyncio.get_running_loop()
+        t0 = loop.time()
+        try:
+            for i in range(0, len(data), block):
+                writer.write(payload[i * frame_len:(i + block) * frame_len])
+                # drain() waits when the client does not keep up
+                await writer.drain()
+                if speed:
+                    delay = t0 + (i + block) / (samplerate * speed) - loop.time()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+async def replay_and_record(wav_path, out_path, speed=10.0):
+    samplerate, _ = wavfile.read(wav_path)
+    server = await serve_wav(wav_path, speed=speed)
+    host, port = server.sockets[0].getsockname()[:2]
+
+    client = AcquisitionClient(samplerate, bits=14)
+    client.add_consumer(Recorder(out_path, samplerate), lossless=True)
+    rms = LiveRMS(samplerate)
+    client.add_consumer(rms)
+    async with server:
+        await client.run_tcp(host, port)
+    print(f"last RMS: {rms.value:.0f}")
+    print(client.stats())
+
+
+if __name__ == "__main__":
+    date, subject = "250117", "PA"
+    wav_file_path = os.path.join("data", "on_off_10sec", f"on_off_10s_{date}_{subject}.wav")
+    asyncio.run(replay_and_record(wav_file_path, f"live_{date}_{subject}.wav"))
@@ -0,0 +1,96 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# EMG features that only need NumPy, shared by the offline analysis
+# (spectral_features.py, on_off_decoder.py) and the live decoder
+# (on_off_inference.py).
+
+# typical surface EMG band (same limits as u3_RMS_test.py)
+EMG_BAND = (20.0, 450.0)
+BANDS = {
+    "low": (20.0, 80.0),
+    "mid": (80.0, 150.0),
+    "high": (150.0, 450.0),
+}
+
+FEATURE_NAMES = ["log_rms", "log_wl", "zcr", "mean_freq", "median_freq",
+                 "log_rel_low", "log_rel_mid", "log_rel_high"]
+# amplitude features depend on electrode placement and gain, they are used
+# relative to the subject's rest level
+AMPLITUDE_FEATURES = [0, 1]
+# the rest level is this percentile of the amplitude features over windows at
+# rest: the off epochs when training, a rest stretch when calibrating live
+REST_PERCENTILE = 50
+
+
+def spectral_features(freqs, psd, band=EMG_BAND, bands=BANDS):
+    """
+    Median frequency, mean frequency and band powers of every PSD row.
+
+    :return: dict of 1D arrays, one value per epoch
+    """
+    df = freqs[1] - freqs[0]
+    in_band = (freqs >= band[0]) & (freqs <= band[1])
+    f, p = freqs[in_band], psd[:, in_band]
+    power = p.sum(axis=1)
+    safe_power = np.where(power > 0, power, 1)
+
+    # median frequency: first bin where the cumulative power reaches half the total
+    cum = np.cumsum(p, axis=1)
+    median_idx = np.argmax(cum >= 0.5 * cum[:, -1:], axis=1)
+
+    features = {
+        "total_power": power * df,
+        "mean_freq": (p @ f) / safe_power,
+        "median_freq": f[median_idx],
+    }
+    for name, (lo, hi) in bands.items():
+        sel = (freqs >= lo) & (freqs < hi)
+        features[f"power_{name}"] = psd[:, sel].sum(axis=1) * df
+    return features
+
+
+def strided_windows(data, window_size, step):
+    """
+    (n_windows, window_size) view of the signal, one window every `step` samples.
+    """
+    return sliding_window_view(data, window_size)[::step]
+
+
+def window_features(windows, samplerate):
+    """
+    Feature matrix (n_windows, n_features) of a stack of windows.
+
+    Works the same for a batch of windows and for a single window (shape (1, n)).
+    """
+    x = windows.astype(np.float64)
+    x -= x.mean(axis=1, keepdims=True)
+    n = x.shape[1]
+    eps = 1e-12
+
+    rms = np.sqrt(np.einsum("ij,ij->i", x, x) / n)
+    wl = np.abs(np.diff(x, axis=1)).sum(axis=1) / n
+    zcr = np.count_nonzero(np.signbit(x[:, 1:]) != np.signbit(x[:, :-1]), axis=1) / n
+
+    spectrum = np.fft.rfft(x * np.hanning(n), axis=1)
+    psd = spectrum.real ** 2 + spectrum.imag ** 2
+    spec = spectral_features(np.fft.rfftfreq(n, 1 / samplerate), psd)
+    total = spec["power_low"] + spec["power_mid"] + spec["power_high"] + eps
+
+    return np.column_stack((
+        np.log(rms + eps),
+        np.log(wl + eps),
+        zcr,
+        spec["mean_freq"],
+        spec["median_freq"],
+        np.log(spec["power_low"] / total + eps),
+        np.log(spec["power_mid"] / total + eps),
+        np.log(spec["power_high"] / total + eps),
+    ))
+
+
+def amplitude_reference(rest_features):
+    """
+    Rest level of the amplitude features, from the features of windows at rest.
+    """
+    return np.percentile(rest_features[:, AMPLITUDE_FEATURES], REST_PERCENTILE, axis=0)
@@ -0,0 +1,134 @@
+import numpy as np
+
+# Contiguous activation intervals stored as onset/offset sample indices.
+#
+# A recording of N samples with K threshold crossings costs O(K) here instead of
+# the O(N) boolean mask. All intervals are half-open [onset, offset), sorted and
+# non-overlapping.
+
+
+class Intervals:
+    def __init__(self, onsets=(), offsets=()):
+        self.onsets = np.asarray(onsets, dtype=np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        if self.onsets.shape != self.offsets.shape:
+            raise ValueError("onsets and offsets must have the same length.")
+
+    @classmethod
+    def from_mask(cls, mask):
+        """
+        Run-length encode a boolean mask.
+        """
+        edges = np.diff(np.asarray(mask, dtype=np.int8), prepend=0, append=0)
+        return cls(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1))
+
+    @classmethod
+    def from_threshold(cls, signal, threshold):
+        """
+        Intervals where `signal > threshold`.
+        """
+        return cls.from_mask(np.asarray(signal) > threshold)
+
+    def __len__(self):
+        return len(self.onsets)
+
+    def __repr__(self):
+        return f"Intervals({len(self)} intervals, {self.total_duration()} samples)"
+
+    def __eq__(self, other):
+        return (isinstance(other, Intervals)
+                and np.array_equal(self.onsets, other.onsets)
+                and np.array_equal(self.offsets, other.offsets))
+
+    def to_mask(self, n_samples):
+        """
+        Expand back to a boolean mask of length n_samples (only for small signals).
+        """
+        mask = np.zeros(n_samples + 1, dtype=np.int8)
+        np.add.at(mask, np.minimum(self.onsets, n_samples), 1)
+        np.add.at(mask, np.minimum(self.offsets, n_samples), -1)
+        return np.cumsum(mask[:-1]) > 0
+
+    def durations(self):
+        return self.offsets - self.onsets
+
+    def total_duration(self):
+        return int(np.sum(self.durations()))
+
+    def _combine(self, other, min_level):
+        # sweep over all boundaries: +1 at every onset, -1 at every offset, and keep
+        # the stretches where at least `min_level` intervals are active
+        positions = np.concatenate((self.onsets, other.onsets, self.offsets, other.offsets))
+        n_on = len(self) + len(other)
+        deltas = np.concatenate((np.ones(n_on, dtype=np.int64), -np.ones(n_on, dtype=np.int64)))
+        # at equal positions close before opening, so touching intervals stay apart
+        order = np.lexsort((deltas, positions))
+        positions, level = positions[order], np.cumsum(deltas[order])
+        active = level >= min_level
+        starts = np.flatnonzero(active & ~np.concatenate(([False], active[:-1])))
+        stops = np.flatnonzero(~active & np.concatenate(([False], active[:-1])))
+        result = Intervals(positions[starts], positions[stops])
+        return result.merge_gaps(0)
+
+    def union(self, other):
+        return self._combine(other, 1)
+
+    def intersect(self, other):
+        return self._combine(other, 2)
+
+    def merge_gaps(self, max_gap):
+        """
+        Merge intervals separated by at most max_gap samples (0 joins touching ones).
+        """
+        if len(self) == 0:
+            return Intervals()
+        keep = self.onsets[1:] - self.offsets[:-1] > max_gap
+        onsets = self.onsets[np.concatenate(([True], keep))]
+        offsets = self.offsets[np.concatenate((keep, [True]))]
+        return Intervals(onsets, offsets)
+
+    def min_duration(self, n_samples):
+        """
+        Drop intervals shorter than n_samples.
+        """
+        keep = self.durations() >= n_samples
+        return Intervals(self.onsets[keep], self.offsets[keep])
+
+    def active_before(self, x):
+        """
+        Number of active samples in [0, x), for any array of positions x.
+        """
+        x = np.asarray(x)
+        if len(self) == 0:
+            return np.zeros(x.shape, dtype=np.int64)
+        lengths = self.durations()
+        cum = np.concatenate(([0], np.cumsum(lengths)))
+        k = np.searchsorted(self.onsets, x, side='right') - 1
+        valid = k >= 0
+        k = np.maximum(k, 0)
+        partial = np.clip(x - self.onsets[k], 0, lengths[k])
+        return np.where(valid, cum[k] + partial, 0)
+
+    def overlap(self, starts, stops):
+        """
+        Number of active samples inside every window [start, stop).
+        """
+        return self.active_before(stops) - self.active_before(starts)
+
+    def coverage(self, starts, stops):
+        """
+        Fraction of every window [start, stop) that is active.
+        """
+        starts, stops = np.asarray(starts), np.asarray(stops)
+        return self.overlap(starts, stops) / (stops - starts)
+
+
+def plot_intervals(ax, intervals, timebase, level, **kwargs):
+    """
+    Draw every interval as a horizontal segment at height `level`.
+
+    One line per interval instead of one marker per sample; `timebase` is the
+    on_off_task.TimeBase of the signal the intervals were found in.
+    """
+    t_on, t_off = timebase.time(intervals.onsets), timebase.time(intervals.offsets)
+    return ax.hlines(np.full(len(intervals), level), t_on, t_off, **kwargs)
@@ -0,0 +1,146 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from sklearn.linear_model import LogisticRegression
+
+from emg_features import AMPLITUDE_FEATURES, amplitude_reference, strided_windows, window_features
+from on_off_inference import OnOffDecoder
+from on_off_task import COHORT, TimeBase, epoch_bounds, iter_cohort, load_recording
+
+# Window-by-window on/off decoder for BMI control.
+#
+# Features are computed on strided windows (views, no copies) of the raw EMG:
+# RMS envelope, waveform length, zero crossings and spectral features (see
+# emg_features.py). A logistic regression is trained with scikit-learn, but the
+# trained OnOffDecoder (on_off_inference.py) only keeps NumPy arrays, so live
+# inference imports neither scikit-learn nor this module.
+
+
+def window_labels(centers, starts, stops, is_on, margin=0):
+    """
+    Label every window by the epoch its center falls in.
+
+    Windows outside the epochs, or closer than `margin` samples to an epoch
+    boundary (the subject is still reacting to the cue), get -1.
+    """
+    labels = np.full(len(centers), -1, dtype=np.int8)
+    k = np.searchsorted(starts, centers, side='right') - 1
+    inside = (k >= 0) & (centers >= starts[np.maximum(k, 0)] + margin) \
+        & (centers < stops[np.maximum(k, 0)] - margin)
+    labels[inside] = is_on[k[inside]]
+    return labels
+
+
+def recording_dataset(date, subject, window_ms=200, step_ms=50, margin_sec=1.0,
+                      rest_sec=10):
+    """
+    Raw features and labels of every labelled window of one recording.
+
+    :param rest_sec: length of the rest stretch kept before the marker
+    :return: X (n_windows, n_features), y (n_windows,), rest signal (the
+             `rest_sec` seconds before the marker, unlabelled, for calibrate())
+    """
+    samplerate, data, marker = load_recording(date, subject)
+    timebase = TimeBase(samplerate, len(data))
+    window_size = int(window_ms * samplerate / 1000)
+    step = int(step_ms * samplerate / 1000)
+    windows = strided_windows(data, window_size, step)
+    centers = np.arange(len(windows)) * step + window_size // 2
+
+    starts, stops, is_on = epoch_bounds(marker, timebase)
+    y = window_labels(centers, starts, stops, is_on, int(margin_sec * samplerate))
+    keep = y >= 0
+    X = window_features(windows[keep], samplerate)
+    return X, y[keep], data[timebase.slice(marker - rest_sec, marker)]
+
+
+def cohort_dataset(cohort=COHORT, **kwargs):
+    """
+    Windows of the whole cohort.
+
+    :return: X (raw features), y, groups (one subject name per window),
+             rest signals {subject name: rest signal}
+    """
+    Xs, ys, groups, rests = [], [], [], {}
+    for date, subject in iter_cohort(cohort):
+        X, y, rest = recording_dataset(date, subject, **kwargs)
+        Xs.append(X)
+        ys.append(y)
+        groups.append(np.full(len(y), f"{date}_{subject}"))
+        rests[f"{date}_{subject}"] = rest
+    return np.concatenate(Xs), np.concatenate(ys), np.concatenate(groups), rests
+
+
+def off_referenced(X, y, groups):
+    """
+    Amplitude features relative to every subject's own off-epoch windows.
+
+    Uses the labels, so it is only for training subjects; a new subject is
+    referenced through OnOffDecoder.calibrate() on an unlabelled rest stretch.
+    """
+    X = X.copy()
+    for group in np.unique(groups):
+        rows = np.flatnonzero(groups == group)
+        X[np.ix_(rows, AMPLITUDE_FEATURES)] -= amplitude_reference(X[rows[y[rows] == 0]])
+    return X
+
+
+def train_decoder(X, y, samplerate, window_size):
+    """
+    Train an OnOffDecoder on normalized window features.
+    """
+    mean = X.mean(axis=0)
+    scale = X.std(axis=0)
+    scale[scale == 0] = 1
+    model = LogisticRegression(max_iter=1000)
+    model.fit((X - mean) / scale, y)
+    return OnOffDecoder(samplerate, window_size, mean, scale, model.coef_[0], model.intercept_[0])
+
+
+def _loso_fold(args):
+    X, y, groups, rest, subject, samplerate, window_size = args
+    test = groups == subject
+    decoder = train_decoder(off_referenced(X[~test], y[~test], groups[~test]), y[~test],
+                            samplerate, window_size)
+    # the held-out subject is referenced like a live one, without its labels
+    decoder.calibrate(rest)
+    predicted = decoder.predict_raw(X[test])
+    return subject, float(np.mean(predicted == y[test]))
+
+
+def leave_one_subject_out(X, y, groups, rests, samplerate, window_size, processes=None):
+    """
+    Leave-one-subject-out accuracy, one fold per worker process.
+
+    The held-out subject is calibrated on its rest signal, as in the live loop.
+
+    :return: list of (subject, accuracy)
+    """
+    folds = [(X, y, groups, rests[subject], subject, samplerate, window_size)
+             for subject in np.unique(groups)]
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return list(pool.map(_loso_fold, folds))
+
+
+if __name__ == "__main__":
+    import time
+
+    from quality_check import good_recordings
+
+    window_ms = 200
+    X, y, groups, rests = cohort_dataset(good_recordings(), window_ms=window_ms)
+    samplerate, _, _ = load_recording(*next(iter_cohort()))
+    window_size = int(window_ms * samplerate / 1000)
+
+    for subject, accuracy in leave_one_subject_out(X, y, groups, rests, samplerate,
+                                                   window_size):
+        print(f"{subject:12}{accuracy:8.3f}")
+
+    decoder = train_decoder(off_referenced(X, y, groups), y, samplerate, window_size)
+    rng = np.random.default_rng(0)
+    decoder.calibrate(rng.normal(0, 100, 10 * samplerate))
+    window = rng.normal(0, 100, window_size)
+    n = 1000
+    t0 = time.perf_counter()
+    for _ in range(n):
+        decoder.predict_window(window)
+    print(f"inference: {(time.perf_counter() - t0) / n * 1e6:.0f} us per window")
@@ -0,0 +1,104 @@
+import numpy as np
+
+from emg_features import AMPLITUDE_FEATURES, amplitude_reference, strided_windows, window_features
+
+# Live side of the on/off decoder: only NumPy is needed to load a trained
+# decoder (see on_off_decoder.py for training) and decode windows.
+
+
+class OnOffDecoder:
+    """
+    Logistic regression on standardized window features, NumPy only.
+    """
+    def __init__(self, samplerate, window_size, mean, scale, coef, intercept, reference=None):
+        self.samplerate = samplerate
+        self.window_size = window_size
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = float(intercept)
+        # rest level of the subject, set by calibrate(); needed for raw windows
+        self.reference = None if reference is None else np.asarray(reference, dtype=np.float64)
+        self._fold()
+
+    def _fold(self):
+        # fold the standardization and the rest level into the weights, so a
+        # prediction is a single dot product
+        self._w = self.coef / self.scale
+        self._b_normalized = self.intercept - self.mean @ self._w
+        self._b = None
+        if self.reference is not None:
+            self._b = self._b_normalized - self.reference @ self._w[AMPLITUDE_FEATURES]
+
+    def calibrate(self, rest_signal, step=None):
+        """
+        Set the subject's rest level from a stretch of signal recorded at rest.
+        """
+        step = step or self.window_size // 4
+        X = window_features(strided_windows(rest_signal, self.window_size, step), self.samplerate)
+        self.reference = amplitude_reference(X)
+        self._fold()
+
+    def predict_proba(self, features):
+        """
+        Probability of "on" for every row of a feature matrix that is already
+        relative to the rest level (e.g. the training features of on_off_decoder.py).
+        """
+        return 1 / (1 + np.exp(-(features @ self._w + self._b_normalized)))
+
+    def predict_raw(self, features):
+        """
+        On/off decision for every row of a raw feature matrix (window_features()).
+
+        The decoder must be calibrated first: it was trained on amplitudes
+        relative to the rest level, which raw windows do not have.
+        """
+        if self._b is None:
+            raise RuntimeError("The decoder is not calibrated, call calibrate() with a "
+                               "stretch of rest signal first.")
+        return features @ self._w + self._b > 0
+
+    def predict_window(self, window):
+        """
+        On/off decision for a single raw window (live loop), see predict_raw().
+        """
+        return bool(self.predict_raw(window_features(window[None, :], self.samplerate))[0])
+
+    def save(self, path):
+        arrays = dict(samplerate=self.samplerate, window_size=self.window_size, mean=self.mean,
+                      scale=self.scale, coef=self.coef, intercept=self.intercept)
+        if self.reference is not None:
+            arrays["reference"] = self.reference
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        f = np.load(path)
+        reference = f["reference"] if "reference" in f.files else None
+        return cls(int(f["samplerate"]), int(f["window_size"]), f["mean"], f["scale"],
+                   f["coef"], float(f["intercept"]), reference)
+
+
+class DecoderConsumer:
+    """
+    Acquisition consumer (see acquisition.py) that decodes the newest window.
+    """
+    def __init__(self, decoder, ring, callback=None, channel=0):
+        self.decoder = decoder
+        self.ring = ring
+        self.callback = callback
+        self.channel = channel
+        self.state = False
+        self._frames = np.zeros((decoder.window_size, ring.data.shape[1]), dtype=ring.data.dtype)
+
+    def start(self):
+        pass
+
+    def process(self, block):
+        self.ring.latest(self._frames)
+        self.state = self.decoder.predict_window(self._frames[:, self.channel])
+        if self.callback is not None:
+            self.callback(self.state)
+
+    def stop(self):
+        pass
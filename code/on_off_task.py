@@ -0,0 +1,189 @@
+import os
+import numpy as np
+from scipy.io import wavfile
+
+# recordings live under data/on_off_10sec (run from the repo root, like the u3 scripts)
+DATA_DIR = os.path.join("data", "on_off_10sec")
+
+# every recorded subject, grouped by recording date
+COHORT = {
+    "250110": ["AM", "GS", "KK", "KN", "LG", "MG", "MK", "MP", "OG", "SM"],
+    "250117": ["KM", "PA", "VK"],
+}
+
+# the task: starting at the marker, 6 epochs of 10 seconds alternating on/off
+EPOCH_SEC = 10
+N_EPOCHS = 6
+
+
+class TimeBase:
+    """
+    Time base of a sampled signal: sample rate, time of the first sample and length.
+
+    Converts between seconds and sample indices on demand, so no float time
+    array is needed; axis() builds one only when a plot asks for it.
+    """
+    def __init__(self, samplerate, n_samples, start=0.0):
+        self.samplerate = samplerate
+        self.n_samples = n_samples
+        self.start = start
+
+    def __len__(self):
+        return self.n_samples
+
+    def __repr__(self):
+        return f"TimeBase({self.samplerate} Hz, {self.n_samples} samples, start={self.start} s)"
+
+    @property
+    def duration(self):
+        return self.n_samples / self.samplerate
+
+    def index(self, t):
+        """
+        Nearest sample index of a time (or array of times) in seconds.
+        """
+        i = np.rint((np.asarray(t) - self.start) * self.samplerate).astype(np.int64)
+        return int(i) if i.ndim == 0 else i
+
+    def time(self, i):
+        """
+        Time in seconds of a sample index (or array of indices).
+        """
+        return self.start + np.asarray(i) / self.samplerate
+
+    def samples(self, seconds):
+        """
+        Number of samples in a duration.
+        """
+        return int(round(seconds * self.samplerate))
+
+    def slice(self, t0, t1):
+        """
+        Index slice of the samples in [t0, t1), clipped to the signal.
+        """
+        i0 = min(max(self.index(t0), 0), self.n_samples)
+        i1 = min(max(self.index(t1), i0), self.n_samples)
+        return slice(i0, i1)
+
+    def crop(self, sl):
+        """
+        Time base of data[sl]; times stay the same as in the full signal.
+        """
+        i0, i1, _ = sl.indices(self.n_samples)
+        return TimeBase(self.samplerate, max(i1 - i0, 0), self.time(i0))
+
+    def axis(self):
+        """
+        Time of every sample in seconds (only for plotting).
+        """
+        return self.start + np.arange(self.n_samples) / self.samplerate
+
+
+def recording_paths(date, subject):
+    """
+    Return the (wav, events) file paths of one recording.
+    """
+    stem = os.path.join(DATA_DIR, f"on_off_10s_{date}_{subject}")
+    return stem + ".wav", stem + "_events.txt"
+
+
+def iter_cohort(cohort=COHORT):
+    """
+    Yield (date, subject) for every recording of the cohort that exists on disk.
+    """
+    for date, subjects in cohort.items():
+        for subject in subjects:
+            wav_path, _ = recording_paths(date, subject)
+            if os.path.isfile(wav_path):
+                yield date, subject
+
+
+def load_recording(date, subject, event_id="2"):
+    """
+    Read one recording and its task marker.
+
+    :return: samplerate, data (1D int16 array), marker time in seconds
+    """
+    wav_path, events_path = recording_paths(date, subject)
+    samplerate, data = wavfile.read(wav_path)
+
+    # if stereo, select only one channel (e.g., left channel)
+    if data.ndim == 2:
+        data = data[:, 0]
+
+    events = read_events(events_path, event_id)
+    if not events:
+        raise ValueError(f"No events found with ID={event_id} in {events_path}.")
+    return samplerate, data, events[0]
+
+
+def epoch_bounds(marker, timebase, n_epochs=N_EPOCHS, epoch_sec=EPOCH_SEC):
+    """
+    Sample bounds of the task epochs that follow the marker.
+
+    The first epoch after the marker is "on", then they alternate.
+    Epochs that run past the end of the recording are dropped.
+
+    :param marker: marker time in seconds
+    :param timebase: TimeBase of the recording
+    :return: starts, stops (int arrays, half-open [start, stop)), is_on (bool array)
+    """
+    epoch_len = timebase.samples(epoch_sec)
+    starts = timebase.index(marker) + epoch_len * np.arange(n_epochs)
+    stops = starts + epoch_len
+    is_on = np.arange(n_epochs) % 2 == 0
+    keep = (starts >= 0) & (stops <= len(timebase))
+    return starts[keep], stops[keep], is_on[keep]
+
+
+def moving_rms(signal, window_size):
+    """
+    Centered moving RMS, same length as the input (like np.convolve(..., mode='same')).
+
+    Uses a cumulative sum, so the cost does not depend on the window size.
+
+    :param signal: 1D numpy array of EMG data
+    :param window_size: number of samples in the RMS window
+    :return: float64 array with len(signal) RMS values
+    """
+    power = np.square(signal, dtype=np.float64)
+    csum = np.concatenate(([0.0], np.cumsum(power)))
+    n = len(signal)
+    # window [i - half, i - half + window_size), clipped at the edges like mode='same'
+    half = window_size // 2
+    idx = np.arange(n)
+    lo = np.clip(idx - half, 0, n)
+    hi = np.clip(idx - half + window_size, 0, n)
+    # mode='same' divides by the full window size even at the edges
+    mean_power = (csum[hi] - csum[lo]) / window_size
+    return np.sqrt(np.maximum(mean_power, 0.0))
+
+
+def read_events(filename, marker_id_to_return):
+    events = []
+
+    with open(filename, 'r') as f:
+        for line in f:
+            line = line.strip()
+
+            # Skip empty lines or comment lines (lines starting with "#")
+            if not line or line.startswith('#'):
+                continue
+
+            # Each valid line should be "id, time_in_seconds"
+            parts = line.split(',')
+            if len(parts) < 2:
+                continue  # skip malformed lines
+
+            event_id = parts[0].strip()
+            try:
+                time_in_seconds = float(parts[1].strip())
+            except ValueError:
+                # If we can't parse the time as float, skip the line
+                continue
+
+            # Pick only the timestamps whose ID matches
+            if event_id == marker_id_to_return:
+                events.append(time_in_seconds)
+
+    return events
@@ -0,0 +1,176 @@
+import os
+import numpy as np
+import pandas as pd
+from scipy.io import wavfile
+
+from emg_intervals import Intervals
+from on_off_task import (COHORT, DATA_DIR, TimeBase, epoch_bounds, iter_cohort,
+                         read_events, recording_paths)
+
+# Signal-quality screening of a recording before any expensive processing.
+#
+# The WAV file is memory mapped and read once, a chunk at a time. Every chunk is
+# reshaped into 1 s blocks and all statistics are computed for all blocks at
+# once: clipping, flat stretches, mains hum (single DFT bins, like Goertzel but
+# as one matrix product) and the signal power inside the on/off epochs.
+
+LINE_FREQ = 50.0
+LINE_HARMONICS = 3
+
+# a recording is flagged when it exceeds any of these limits
+LIMITS = {
+    "clip_ratio": 0.01,       # fraction of samples at full scale
+    "flat_ratio": 0.05,       # fraction of samples in flat runs
+    "line_ratio": 0.3,        # median fraction of block power at 50 Hz and harmonics
+    "min_rms": 5.0,           # below this the electrode is probably disconnected
+    "min_snr_db": 6.0,        # on vs off epoch power
+}
+
+
+def _line_basis(block_size, samplerate, line_freq=LINE_FREQ, n_harmonics=LINE_HARMONICS):
+    # windowed complex exponentials of the mains frequency and its harmonics
+    t = np.arange(block_size) / samplerate
+    freqs = line_freq * np.arange(1, n_harmonics + 1)
+    freqs = freqs[freqs < samplerate / 2]
+    window = np.hanning(block_size)
+    basis = window[:, None] * np.exp(-2j * np.pi * freqs[None, :] * t[:, None])
+    # scale so a pure tone gives its full power
+    return basis / (window.sum() / np.sqrt(2))
+
+
+def quality_report(wav_path, events_path=None, event_id="2", block_sec=1.0,
+                   chunk_sec=60.0, flat_ms=50, limits=LIMITS):
+    """
+    Quality statistics of one recording, computed in a single streaming pass.
+
+    :return: dict with the statistics, "problems" (list of str) and "ok"
+    """
+    samplerate, data = wavfile.read(wav_path, mmap=True)
+    if data.ndim == 2:
+        data = data[:, 0]
+    n = len(data)
+    full_scale = np.iinfo(data.dtype).max if data.dtype.kind == "i" else 1.0
+    block = int(block_sec * samplerate)
+    chunk = max(block, int(chunk_sec * samplerate) // block * block)
+    basis = _line_basis(block, samplerate)
+
+    starts = stops = is_on = None
+    if events_path is not None:
+        events = read_events(events_path, event_id)
+        if events:
+            starts, stops, is_on = epoch_bounds(events[0], TimeBase(samplerate, n))
+    epoch_power = np.zeros(0 if starts is None else len(starts))
+
+    n_clipped = 0
+    total_power = 0.0
+    flat_runs = []
+    block_rms = []
+    line_ratio = []
+    for c0 in range(0, n, chunk):
+        x = np.asarray(data[c0:c0 + chunk], dtype=np.float64)
+        n_clipped += int(np.count_nonzero(np.abs(x) >= full_scale))
+        power = x * x
+        total_power += power.sum()
+
+        # flat runs: consecutive equal samples, the previous sample joins the chunks
+        prev = data[c0 - 1] if c0 else np.nan
+        runs = Intervals.from_mask(np.diff(x, prepend=prev) == 0)
+        flat_runs.append(Intervals(runs.onsets + c0, runs.offsets + c0))
+
+        # per-block statistics of the full blocks of the chunk
+        n_blocks = len(x) // block
+        if n_blocks:
+            blocks = x[:n_blocks * block].reshape(n_blocks, block)
+            blocks = blocks - blocks.mean(axis=1, keepdims=True)
+            block_power = np.einsum("ij,ij->i", blocks, blocks) / block
+            block_rms.append(np.sqrt(block_power))
+            line_power = (np.abs(blocks @ basis) ** 2).sum(axis=1)
+            line_ratio.append(line_power / np.maximum(block_power, 1e-12))
+
+        # power inside every epoch that overlaps the chunk
+        if len(epoch_power):
+            csum = np.concatenate(([0.0], np.cumsum(power)))
+            lo = np.clip(starts - c0, 0, len(x))
+            hi = np.clip(stops - c0, 0, len(x))
+            epoch_power += csum[hi] - csum[lo]
+
+    # chunks are in order, so joining them only needs the runs cut at a chunk edge merged
+    flat = Intervals(np.concatenate([r.onsets for r in flat_runs]),
+                     np.concatenate([r.offsets for r in flat_runs])).merge_gaps(0)
+    # a run of k equal samples starts one sample before its first zero difference
+    flat = Intervals(flat.onsets - 1, flat.offsets).min_duration(int(flat_ms * samplerate / 1000))
+
+    block_rms = np.concatenate(block_rms) if block_rms else np.zeros(1)
+    line_ratio = np.concatenate(line_ratio) if line_ratio else np.zeros(1)
+    report = {
+        "file": wav_path,
+        "samplerate": samplerate,
+        "duration_s": n / samplerate,
+        "rms": float(np.sqrt(total_power / max(n, 1))),
+        "median_block_rms": float(np.median(block_rms)),
+        "clip_ratio": n_clipped / max(n, 1),
+        "flat_ratio": flat.total_duration() / max(n, 1),
+        "longest_flat_s": float(flat.durations().max() / samplerate) if len(flat) else 0.0,
+        "line_ratio": float(np.median(line_ratio)),
+        "snr_db": np.nan,
+    }
+    if len(epoch_power) and is_on.any() and (~is_on).any():
+        mean_power = epoch_power / (stops - starts)
+        on, off = mean_power[is_on].mean(), mean_power[~is_on].mean()
+        report["snr_db"] = float(10 * np.log10(on / off)) if off > 0 and on > 0 else np.nan
+
+    problems = []
+    if report["clip_ratio"] > limits["clip_ratio"]:
+        problems.append("clipping")
+    if report["flat_ratio"] > limits["flat_ratio"]:
+        problems.append("flatline")
+    if report["line_ratio"] > limits["line_ratio"]:
+        problems.append("line noise")
+    if report["median_block_rms"] < limits["min_rms"]:
+        problems.append("disconnected")
+    if events_path is not None:
+        if starts is None:
+            problems.append("no task marker")
+        elif not (is_on.any() and (~is_on).any()):
+            problems.append("no on/off epochs")
+        elif np.isfinite(report["snr_db"]) and report["snr_db"] < limits["min_snr_db"]:
+            problems.append("low on/off SNR")
+    report["problems"] = problems
+    report["ok"] = not problems
+    return report
+
+
+def screen_cohort(cohort=COHORT, **kwargs):
+    """
+    Quality report of every recording of the cohort as a DataFrame.
+    """
+    rows = []
+    for date, subject in iter_cohort(cohort):
+        wav_path, events_path = recording_paths(date, subject)
+        report = quality_report(wav_path, events_path, **kwargs)
+        report["problems"] = ", ".join(report["problems"])
+        rows.append({"date": date, "subject": subject, **report})
+    return pd.DataFrame(rows)
+
+
+def good_recordings(cohort=COHORT, **kwargs):
+    """
+    Cohort restricted to the recordings that pass the quality check,
+    in the same {date: [subjects]} form as on_off_task.COHORT.
+    """
+    table = screen_cohort(cohort, **kwargs)
+    for row in table[~table["ok"]].itertuples():
+        print(f"Skipping {row.date}_{row.subject}: {row.problems}")
+    good = {}
+    for row in table[table["ok"]].itertuples():
+        good.setdefault(row.date, []).append(row.subject)
+    return good
+
+
+if __name__ == "__main__":
+    table = screen_cohort()
+    output_file = os.path.join(DATA_DIR, "quality_report.csv")
+    table.to_csv(output_file, index=False, float_format="%.4g")
+    print(table[["date", "subject", "clip_ratio", "flat_ratio", "line_ratio",
+                 "median_block_rms", "snr_db", "problems"]].to_string(index=False))
+    print(f"Saved report to {output_file}")
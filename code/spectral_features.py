@@ -0,0 +1,123 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from scipy.signal import get_window, welch
+
+from emg_features import spectral_features
+from on_off_task import COHORT, TimeBase, epoch_bounds, iter_cohort, load_recording
+
+# Spectral features of every on/off epoch of every subject.
+#
+# All epochs have the same length, so they are stacked into one 2D array and the
+# Welch PSD of the whole stack is computed in a single call (one window, one FFT
+# size for every row). Large stacks are split into chunks for a process pool.
+
+# below this many epochs batch_features stays in-process
+POOL_MIN_EPOCHS = 2048
+
+
+def stack_epochs(data, starts, stops):
+    """
+    Stack equally long epochs of a 1D signal into a (n_epochs, epoch_len) array.
+    """
+    lengths = np.asarray(stops) - np.asarray(starts)
+    if len(lengths) and np.any(lengths != lengths[0]):
+        raise ValueError("All epochs must have the same length.")
+    epoch_len = lengths[0] if len(lengths) else 0
+    return data[np.asarray(starts)[:, None] + np.arange(epoch_len)]
+
+
+def epoch_spectra(stack, samplerate, nperseg=None):
+    """
+    Welch PSD of every row of the epoch stack in one batched call.
+
+    :param nperseg: segment length in samples (default: 0.5 s)
+    :return: frequencies (n_freqs,), psd (n_epochs, n_freqs)
+    """
+    if nperseg is None:
+        nperseg = int(0.5 * samplerate)
+    window = get_window("hann", nperseg)
+    return welch(stack, fs=samplerate, window=window, nperseg=nperseg, axis=-1)
+
+
+def _chunk_features(args):
+    stack, samplerate, nperseg = args
+    freqs, psd = epoch_spectra(stack, samplerate, nperseg)
+    return spectral_features(freqs, psd)
+
+
+def batch_features(stack, samplerate, nperseg=None, processes=None, chunk_size=256):
+    """
+    Spectral features of an epoch stack, split over a process pool when large.
+
+    Starting a pool costs more than the Welch calls of a small cohort (especially
+    with the spawn start method on Windows), so by default the pool is only used
+    for stacks of at least POOL_MIN_EPOCHS epochs.
+
+    :param processes: number of worker processes (None = in-process unless the
+                      stack is large, 1 = never use a pool)
+    :return: dict of 1D arrays, one value per epoch
+    """
+    if len(stack) == 0:
+        # welch returns no frequencies for an empty stack, use the grid it would have
+        nperseg = nperseg or int(0.5 * samplerate)
+        freqs = np.fft.rfftfreq(nperseg, 1 / samplerate)
+        return spectral_features(freqs, np.zeros((0, len(freqs))))
+    chunks = [(stack[i:i + chunk_size], samplerate, nperseg)
+              for i in range(0, len(stack), chunk_size)]
+    if processes is None and len(stack) >= POOL_MIN_EPOCHS:
+        processes = os.cpu_count()
+    if processes is None or processes == 1 or len(chunks) <= 1:
+        results = [_chunk_features(c) for c in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            results = list(pool.map(_chunk_features, chunks))
+    return {key: np.concatenate([r[key] for r in results]) for key in results[0]}
+
+
+def load_cohort_epochs(cohort=COHORT):
+    """
+    Load every recording and cut its task epochs.
+
+    :return: dict samplerate -> (epoch stack, per-epoch index DataFrame)
+    """
+    groups = {}
+    for date, subject in iter_cohort(cohort):
+        samplerate, data, marker = load_recording(date, subject)
+        timebase = TimeBase(samplerate, len(data))
+        starts, stops, is_on = epoch_bounds(marker, timebase)
+        if len(starts) == 0:
+            print(f"Skipping {date}_{subject}: no complete epochs")
+            continue
+        index = pd.DataFrame({
+            "date": date,
+            "subject": subject,
+            "epoch": np.arange(len(starts)),
+            "is_on": is_on,
+            "start_s": timebase.time(starts),
+        })
+        stacks, indices = groups.setdefault(samplerate, ([], []))
+        stacks.append(stack_epochs(data, starts, stops))
+        indices.append(index)
+    return {sr: (np.concatenate(stacks), pd.concat(indices, ignore_index=True))
+            for sr, (stacks, indices) in groups.items()}
+
+
+def cohort_feature_table(cohort=COHORT, nperseg=None, processes=None):
+    """
+    Per-epoch spectral feature table of the whole cohort.
+    """
+    tables = []
+    for samplerate, (stack, index) in load_cohort_epochs(cohort).items():
+        features = batch_features(stack, samplerate, nperseg, processes)
+        tables.append(index.assign(samplerate=samplerate, **features))
+    return pd.concat(tables, ignore_index=True)
+
+
+if __name__ == "__main__":
+    table = cohort_feature_table()
+    output_file = os.path.join("data", "on_off_10sec", "spectral_features.csv")
+    table.to_csv(output_file, index=False, float_format="%.4g")
+    print(table.groupby("is_on")[["median_freq", "mean_freq", "total_power"]].mean())
+    print(f"Saved {len(table)} epochs to {output_file}")
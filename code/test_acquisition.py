@@ -0,0 +1,71 @@
+import asyncio
+import os
+import numpy as np
+import pytest
+from scipy.io import wavfile
+
+from acquisition import AcquisitionClient, LiveRMS, Recorder, serve_wav
+
+WAV_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "on_off_10sec",
+                        "on_off_10s_250117_PA.wav")
+
+
+class FailingConsumer:
+    def start(self):
+        pass
+
+    def process(self, block):
+        raise RuntimeError("consumer failed")
+
+    def stop(self):
+        pass
+
+
+class FailingStartConsumer(FailingConsumer):
+    def start(self):
+        raise RuntimeError("consumer failed to start")
+
+
+async def replay(client, speed=None, timeout=10):
+    server = await serve_wav(WAV_PATH, speed=speed)
+    host, port = server.sockets[0].getsockname()[:2]
+    async with server:
+        task = asyncio.ensure_future(client.run_tcp(host, port))
+        done, _ = await asyncio.wait({task}, timeout=timeout)
+        if not done:
+            task.cancel()
+            pytest.fail("client.run() did not finish")
+        task.result()
+
+
+def test_replay_round_trip(tmp_path):
+    samplerate, data = wavfile.read(WAV_PATH)
+    out_path = str(tmp_path / "live.wav")
+    client = AcquisitionClient(samplerate, bits=14, buffer_sec=0.5)
+    client.add_consumer(Recorder(out_path, samplerate), lossless=True)
+    client.add_consumer(LiveRMS(samplerate))
+    asyncio.run(replay(client))
+
+    stats = client.stats()
+    assert stats["frames"] == len(data)
+    assert stats["dropped_bytes"] == 0
+    assert stats["consumer_dropped_frames"]["Recorder"] == 0
+    # 14-bit framing drops the 2 lowest bits
+    _, recorded = wavfile.read(out_path)
+    assert np.array_equal(recorded, (data >> 2) << 2)
+
+
+def test_failing_lossless_consumer_does_not_hang():
+    samplerate, _ = wavfile.read(WAV_PATH)
+    client = AcquisitionClient(samplerate, bits=14, buffer_sec=0.5)
+    client.add_consumer(FailingConsumer(), lossless=True)
+    with pytest.raises(RuntimeError, match="consumer failed"):
+        asyncio.run(replay(client))
+
+
+def test_lossless_consumer_failing_to_start_does_not_hang():
+    samplerate, _ = wavfile.read(WAV_PATH)
+    client = AcquisitionClient(samplerate, bits=14, buffer_sec=0.5)
+    client.add_consumer(FailingStartConsumer(), lossless=True)
+    with pytest.raises(RuntimeError, match="consumer failed to start"):
+        asyncio.run(replay(client))
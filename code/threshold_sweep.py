@@ -0,0 +1,255 @@
+import numpy as np
+
+from emg_intervals import Intervals
+from on_off_task import (COHORT, TimeBase, epoch_bounds, iter_cohort,
+                         load_recording, moving_rms)
+
+# Evaluate many thresholds on an EMG envelope in one pass.
+#
+# Instead of building one boolean mask per threshold, every envelope sample is
+# ranked against the sorted thresholds (np.searchsorted). Between two samples the
+# rank can only change where the envelope crosses some thresholds, and the
+# thresholds crossed are exactly the ones between the two ranks. Expanding those
+# rank changes gives the onsets/offsets of every threshold at once.
+
+
+def sweep_thresholds(envelope, thresholds):
+    """
+    Run-length encoded on/off intervals of `envelope > t` for every threshold t.
+
+    The result is stored CSR-style: intervals of thresholds[j] are
+    onsets[indptr[j]:indptr[j+1]] and offsets[indptr[j]:indptr[j+1]],
+    half-open [onset, offset) in samples.
+
+    :param envelope: 1D array (e.g. moving RMS of the EMG)
+    :param thresholds: 1D array of candidate thresholds (any order)
+    :return: sorted thresholds, onsets, offsets, indptr
+    """
+    envelope = np.asarray(envelope)
+    thresholds = np.sort(np.asarray(thresholds, dtype=np.float64))
+    n_thresholds = len(thresholds)
+
+    # rank[i] = number of thresholds strictly below the sample, i.e. the sample is
+    # "on" for thresholds[:rank[i]]. padding with rank 0 closes intervals at the edges
+    rank = np.zeros(len(envelope) + 2, dtype=np.int64)
+    rank[1:-1] = np.searchsorted(thresholds, envelope, side='left')
+    step = np.diff(rank)
+    change = np.flatnonzero(step)
+
+    # rising at sample i: thresholds rank[i-1] .. rank[i]-1 turn on
+    # falling at sample i: thresholds rank[i] .. rank[i-1]-1 turn off
+    lo = np.minimum(rank[change], rank[change + 1])
+    count = np.abs(step[change])
+    position = np.repeat(change, count)
+    rising = np.repeat(step[change] > 0, count)
+    # threshold index of each expanded crossing: lo + 0, 1, ..., count-1
+    group_start = np.repeat(np.cumsum(count) - count, count)
+    threshold_idx = np.repeat(lo, count) + np.arange(len(position)) - group_start
+
+    # group by threshold; a stable sort keeps the crossings in time order
+    order = np.argsort(threshold_idx, kind='stable')
+    threshold_idx, position, rising = threshold_idx[order], position[order], rising[order]
+    onsets = position[rising]
+    offsets = position[~rising]
+
+    n_intervals = np.bincount(threshold_idx[rising], minlength=n_thresholds)
+    indptr = np.concatenate(([0], np.cumsum(n_intervals)))
+    return thresholds, onsets, offsets, indptr
+
+
+def hysteresis_intervals(low, high):
+    """
+    Combine the intervals of a low and a high threshold into hysteresis intervals.
+
+    An interval starts when the envelope rises above the high threshold and only
+    ends when it falls back to the low threshold, so every hysteresis interval is
+    a low-threshold interval cut at its first high-threshold onset.
+
+    :param low, high: Intervals of the low and the high threshold
+    :return: Intervals
+    """
+    # first high onset inside every low interval (high intervals are nested in low ones)
+    first = np.searchsorted(high.onsets, low.onsets, side='left')
+    has_high = first < len(high)
+    has_high[has_high] = high.onsets[first[has_high]] < low.offsets[has_high]
+    return Intervals(high.onsets[first[has_high]], low.offsets[has_high])
+
+
+def threshold_intervals(thresholds, onsets, offsets, indptr, threshold):
+    """
+    Intervals of one threshold out of a sweep_thresholds result.
+    """
+    j = np.searchsorted(thresholds, threshold)
+    if j == len(thresholds) or thresholds[j] != threshold:
+        raise ValueError(f"Threshold {threshold} was not part of the sweep.")
+    return Intervals(onsets[indptr[j]:indptr[j + 1]], offsets[indptr[j]:indptr[j + 1]])
+
+
+def sweep_hysteresis(envelope, pairs):
+    """
+    Hysteresis intervals for many (low, high) threshold pairs.
+
+    All thresholds of all pairs are swept in a single pass over the envelope,
+    the pairing itself only touches the intervals.
+
+    :param envelope: 1D array
+    :param pairs: iterable of (low, high) with low <= high
+    :return: list of Intervals, one per pair
+    """
+    pairs = np.asarray(pairs, dtype=np.float64).reshape(-1, 2)
+    if np.any(pairs[:, 0] > pairs[:, 1]):
+        raise ValueError("Every hysteresis pair must have low <= high.")
+    sweep = sweep_thresholds(envelope, np.unique(pairs))
+    return [hysteresis_intervals(threshold_intervals(*sweep, low),
+                                 threshold_intervals(*sweep, high))
+            for low, high in pairs]
+
+
+def epoch_coverage(onsets, offsets, indptr, starts, stops):
+    """
+    Fraction of every epoch covered by the intervals of every threshold.
+
+    :param onsets, offsets, indptr: output of sweep_thresholds
+    :param starts, stops: epoch sample bounds (half-open)
+    :return: array (n_thresholds, n_epochs) with values in [0, 1]
+    """
+    n_thresholds = len(indptr) - 1
+    if len(onsets) == 0:
+        return np.zeros((n_thresholds, len(starts)))
+
+    # shift every threshold into its own stretch of the time line, so a single
+    # searchsorted serves all thresholds at once
+    span = int(max(offsets.max(), np.max(stops))) + 1
+    owner = np.repeat(np.arange(n_thresholds), np.diff(indptr))
+    g_on = onsets + owner * span
+    lengths = offsets - onsets
+    cum = np.concatenate(([0], np.cumsum(lengths)))
+
+    def active_before(x):
+        # active samples of every threshold in [0, x), x has shape (n_thresholds, n_epochs)
+        gx = x + np.arange(n_thresholds)[:, None] * span
+        k = np.searchsorted(g_on, gx, side='right') - 1
+        first = indptr[:-1][:, None]
+        valid = k >= first
+        k = np.maximum(k, 0)
+        partial = np.minimum(gx - g_on[k], lengths[k])
+        return np.where(valid, cum[k] - cum[first] + partial, 0)
+
+    starts = np.broadcast_to(np.asarray(starts), (n_thresholds, len(starts)))
+    stops = np.broadcast_to(np.asarray(stops), (n_thresholds, len(stops)))
+    covered = active_before(stops) - active_before(starts)
+    return covered / (stops - starts)
+
+
+def score_thresholds(coverage, is_on, min_coverage=0.5):
+    """
+    Hit/miss scores of every threshold against the on/off epochs.
+
+    An epoch counts as detected when at least `min_coverage` of it is active.
+
+    :param coverage: output of epoch_coverage, (n_thresholds, n_epochs)
+    :param is_on: bool array, True for the "on" epochs
+    :return: dict of arrays (one value per threshold): hits, misses,
+             false_alarms, correct_rejections, balanced_accuracy
+    """
+    detected = coverage >= min_coverage
+    is_on = np.asarray(is_on, dtype=bool)
+    hits = np.sum(detected[:, is_on], axis=1)
+    false_alarms = np.sum(detected[:, ~is_on], axis=1)
+    # sample-wise balanced accuracy breaks ties between thresholds with equal counts
+    on_cov = coverage[:, is_on].mean(axis=1) if is_on.any() else np.zeros(len(coverage))
+    off_cov = coverage[:, ~is_on].mean(axis=1) if (~is_on).any() else np.zeros(len(coverage))
+    return {
+        "hits": hits,
+        "misses": np.sum(is_on) - hits,
+        "false_alarms": false_alarms,
+        "correct_rejections": np.sum(~is_on) - false_alarms,
+        "balanced_accuracy": 0.5 * (on_cov + 1 - off_cov),
+    }
+
+
+def candidate_thresholds(envelope, n=200, low_q=0.05, high_q=0.99):
+    """
+    Candidate thresholds spread over the quantiles of the envelope.
+    """
+    return np.unique(np.quantile(envelope, np.linspace(low_q, high_q, n)))
+
+
+def select_threshold(envelope, starts, stops, is_on, thresholds=None, min_coverage=0.5):
+    """
+    Pick the threshold that best separates the on epochs from the off epochs.
+
+    :return: best threshold, scores dict (see score_thresholds) for all candidates,
+             sorted candidate thresholds
+    """
+    if thresholds is None:
+        thresholds = candidate_thresholds(envelope)
+    thresholds, onsets, offsets, indptr = sweep_thresholds(envelope, thresholds)
+    coverage = epoch_coverage(onsets, offsets, indptr, starts, stops)
+    scores = score_thresholds(coverage, is_on, min_coverage=min_coverage)
+    return thresholds[_best(scores)], scores, thresholds
+
+
+def candidate_pairs(envelope, n=40, low_q=0.05, high_q=0.99):
+    """
+    Every (low, high) pair with low <= high out of n quantile thresholds.
+    """
+    thresholds = candidate_thresholds(envelope, n, low_q, high_q)
+    low, high = np.triu_indices(len(thresholds))
+    return np.column_stack((thresholds[low], thresholds[high]))
+
+
+def select_hysteresis(envelope, starts, stops, is_on, pairs=None, min_coverage=0.5):
+    """
+    Pick the (low, high) hysteresis pair that best separates on from off epochs.
+
+    :return: best pair, scores dict (see score_thresholds) for all pairs, pairs
+    """
+    if pairs is None:
+        pairs = candidate_pairs(envelope)
+    pairs = np.asarray(pairs, dtype=np.float64).reshape(-1, 2)
+    coverage = np.array([intervals.coverage(starts, stops)
+                         for intervals in sweep_hysteresis(envelope, pairs)])
+    scores = score_thresholds(coverage.reshape(len(pairs), len(starts)), is_on,
+                              min_coverage=min_coverage)
+    return pairs[_best(scores)], scores, pairs
+
+
+def _best(scores):
+    # most correct epochs first, then the best sample-wise separation
+    correct = scores["hits"] + scores["correct_rejections"]
+    return np.lexsort((-scores["balanced_accuracy"], -correct))[0]
+
+
+def select_cohort_thresholds(cohort=COHORT, window_ms=100):
+    """
+    Select a threshold and a hysteresis pair on the moving RMS envelope of every subject.
+
+    :return: list of (date, subject, threshold, hits, false_alarms, balanced_accuracy,
+             (low, high), hits, false_alarms, balanced_accuracy)
+    """
+    results = []
+    for date, subject in iter_cohort(cohort):
+        samplerate, data, marker = load_recording(date, subject)
+        window_size = int(window_ms * samplerate / 1000)
+        envelope = moving_rms(data, window_size)
+        starts, stops, is_on = epoch_bounds(marker, TimeBase(samplerate, len(data)))
+        threshold, scores, thresholds = select_threshold(envelope, starts, stops, is_on)
+        best = np.searchsorted(thresholds, threshold)
+        pair, pair_scores, pairs = select_hysteresis(envelope, starts, stops, is_on)
+        best_pair = _best(pair_scores)
+        results.append((date, subject, threshold, scores["hits"][best],
+                        scores["false_alarms"][best], scores["balanced_accuracy"][best],
+                        tuple(pair), pair_scores["hits"][best_pair],
+                        pair_scores["false_alarms"][best_pair],
+                        pair_scores["balanced_accuracy"][best_pair]))
+    return results
+
+
+if __name__ == "__main__":
+    print(f"{'date':8}{'subject':9}{'threshold':>10}{'hits':>6}{'FA':>4}{'bal.acc':>9}"
+          f"{'low':>8}{'high':>8}{'hits':>6}{'FA':>4}{'bal.acc':>9}")
+    for (date, subject, threshold, hits, false_alarms, bal_acc,
+         (low, high), pair_hits, pair_false_alarms, pair_bal_acc) in select_cohort_thresholds():
+        print(f"{date:8}{subject:9}{threshold:10.0f}{hits:6d}{false_alarms:4d}{bal_acc:9.3f}"
+              f"{low:8.0f}{high:8.0f}{pair_hits:6d}{pair_false_alarms:4d}{pair_bal_acc:9.3f}")
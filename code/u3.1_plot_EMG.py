@@ -2,13 +2,15 @@ import numpy as np
 import matplotlib.pyplot as plt
 from scipy.io import wavfile
 
+from emg_intervals import Intervals, plot_intervals
+from on_off_task import TimeBase
+
 def plot_wav_with_timestamps(wav_path, events_path, event_id="2"):
     # Read the WAV file
     samplerate, data = wavfile.read(wav_path)
     
-    # Create time axis in seconds
-    duration = len(data) / samplerate
-    time_axis = np.linspace(0, duration, num=len(data))
+    # Time base in seconds (sample rate, start, length) instead of a float time axis
+    timebase = TimeBase(samplerate, len(data))
 
     # Read the events file
     # TASK: edit the events file to correct the marker position
@@ -23,14 +25,14 @@ def plot_wav_with_timestamps(wav_path, events_path, event_id="2"):
     # Find indices where data crosses threshold
     # TASK: use the data to find the right threshold  ADDITIONAL TASK: Preprocess data to make threshold crossing more robust.
     threshold = 30000
-    mask = data > threshold
+    crossings = Intervals.from_threshold(data, threshold)
 
     # Plot the EMG waveform
     plt.figure(figsize=(10, 4))
-    plt.plot(time_axis, data, label='EMG')
+    plt.plot(timebase.axis(), data, label='EMG')
 
-    # Plot a red dot for every timepoint above threshold
-    plt.scatter(time_axis[mask], np.ones(np.sum(mask)) * threshold, color="red", marker="o", label=f">{threshold}")
+    # Plot a red segment for every interval above threshold
+    plot_intervals(plt.gca(), crossings, timebase, threshold, color="red", linewidth=3, label=f">{threshold}")
     plt.axhline(y=threshold, color="gray", linestyle="--", alpha=0.7)
 
     plt.xlabel('Time (s)')
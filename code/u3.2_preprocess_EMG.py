@@ -4,6 +4,10 @@ import matplotlib.pyplot as plt
 from scipy.io import wavfile
 from scipy.signal import medfilt
 
+from emg_intervals import Intervals, plot_intervals
+from on_off_task import TimeBase
+from quality_check import quality_report
+
 date=[ "250117", ]
 subject = ["PA"]
 
@@ -18,9 +22,8 @@ def plot_wav_with_timestamps(wav_path, events_path, event_id="2"):
     # if data.ndim == 2:
     #     data = data[:, 0]
 
-    # create time axis in seconds
-    duration = len(data) / samplerate
-    time_axis = np.linspace(0, duration, num=len(data))
+    # time base in seconds (sample rate, start, length) instead of a float time axis
+    timebase = TimeBase(samplerate, len(data))
 
     # read the events file
     events = read_events(events_path,event_id)
@@ -28,13 +31,14 @@ def plot_wav_with_timestamps(wav_path, events_path, event_id="2"):
         print(f"No events found with ID={event_id}.")
 
     # discard data that are before the start of the task
-    data = data[(time_axis>=(events[0]-10)) & (time_axis<=(events[0]+60))]
-    duration = len(data) / samplerate
-    time_axis = np.linspace(0, duration, num=len(data))
-    events[0] = 10 # after discarding data, marker will always be at 10 seconds
+    task = timebase.slice(events[0] - 10, events[0] + 60)
+    data = data[task]
+    # times stay those of the full recording, so the marker keeps its time
+    timebase = timebase.crop(task)
+    marker = events[0]
 
     # add the 10 second offset for each task epoch
-    events_to_plot = [events[0] + 10 * i for i in range(6)]
+    events_to_plot = [marker + 10 * i for i in range(6)]
     
     # rectify and smooth data
     # ADD code here
@@ -42,15 +46,16 @@ def plot_wav_with_timestamps(wav_path, events_path, event_id="2"):
 
     # find appropriate threshold and find indices where data crosses threshold
     threshold = 1000
-    mask = data > threshold
+    crossings = Intervals.from_threshold(data, threshold)
 
     proc_threshold = 1000
-    proc_mask = processed_data > proc_threshold
+    proc_crossings = Intervals.from_threshold(processed_data, proc_threshold)
 
     # plot the EMG waveform
 
     # Create a figure and two subplots in one column (2 rows x 1 column)
     fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(10, 6), sharex=True)
+    time_axis = timebase.axis()  # only needed for plotting
    
     # make a subplot of the original EMG
     ax1.plot(time_axis, data, label='EMG')
@@ -58,9 +63,9 @@ def plot_wav_with_timestamps(wav_path, events_path, event_id="2"):
     #plot a horizontal line at threshold
     ax1.axhline(y=threshold, color="gray", linestyle="--", alpha=0.7)
     
-    #plot a red dot for every threshold crossing
-    ax1.scatter(time_axis[mask], np.ones(np.sum(mask)) * threshold, 
-                s=5, color="red", marker=".", label=f">{threshold:.0f}", zorder=3)
+    #plot a red segment for every interval above threshold
+    plot_intervals(ax1, crossings, timebase, threshold,
+                   color="red", linewidth=3, label=f">{threshold:.0f}", zorder=3)
    
     ax1.set_xlabel('Time (s)')
     ax1.set_ylabel('Amplitude')
@@ -77,9 +82,9 @@ def plot_wav_with_timestamps(wav_path, events_path, event_id="2"):
     #plot a horizontal line at threshold
     ax2.axhline(y=proc_threshold, color="gray", linestyle="--", alpha=0.7)
     
-    #plot a red dot for every threshold crossing
-    ax2.scatter(time_axis[proc_mask], np.ones(np.sum(proc_mask)) * proc_threshold, 
-                s=5, color="red", marker=".", label=f">{proc_threshold:.0f}", zorder=3)
+    #plot a red segment for every interval above threshold
+    plot_intervals(ax2, proc_crossings, timebase, proc_threshold,
+                   color="red", linewidth=3, label=f">{proc_threshold:.0f}", zorder=3)
    
     ax2.set_xlabel('Time (s)')
     ax2.set_ylabel('Amplitude')
@@ -132,4 +137,9 @@ if __name__ == "__main__":
             wav_file_path = fr"data\on_off_10sec\on_off_10s_{date}_{subject}.wav"
             if os.path.isfile(wav_file_path):
                 events_file = fr"data\on_off_10sec\on_off_10s_{date}_{subject}_events.txt" 
+                # cheap quality check before the processing and plotting
+                report = quality_report(wav_file_path, events_file)
+                if not report["ok"]:
+                    print(f"Skipping {wav_file_path}: {', '.join(report['problems'])}")
+                    continue
                 plot_wav_with_timestamps(wav_file_path, events_file)
\ No newline at end of file
@@ -4,6 +4,10 @@ import matplotlib.pyplot as plt
 from scipy.io import wavfile
 from scipy.signal import medfilt
 
+from emg_intervals import Intervals, plot_intervals
+from on_off_task import TimeBase
+from quality_check import quality_report
+
 date=[ "250117", ]
 subject = ["PA"]
 # subject=["AM", "GS", "KK", "KN", "LG", "MG", "MK","MP", "OG", "SM", "KM", "PA", "VK",]
@@ -16,9 +20,8 @@ def plot_wav_with_timestamps(wav_path, events_path, event_id="2"):
     # if data.ndim == 2:
     #     data = data[:, 0]
 
-    # create time axis in seconds
-    duration = len(data) / samplerate
-    time_axis = np.linspace(0, duration, num=len(data))
+    # time base in seconds (sample rate, start, length) instead of a float time axis
+    timebase = TimeBase(samplerate, len(data))
 
     # read the events file
     events = read_events(events_path,event_id)
@@ -26,13 +29,14 @@ def plot_wav_with_timestamps(wav_path, events_path, event_id="2"):
         print(f"No events found with ID={event_id}.")
 
     # discard data that are before the start of the task
-    data = data[(time_axis>=(events[0]-10)) & (time_axis<=(events[0]+60))]
-    duration = len(data) / samplerate
-    time_axis = np.linspace(0, duration, num=len(data))
-    events[0] = 10 # after discarding data, marker will always be at 10 seconds
+    task = timebase.slice(events[0] - 10, events[0] + 60)
+    data = data[task]
+    # times stay those of the full recording, so the marker keeps its time
+    timebase = timebase.crop(task)
+    marker = events[0]
 
     # add the 10 second offset for each task epoch
-    events_to_plot = [events[0] + 10 * i for i in range(6)]
+    events_to_plot = [marker + 10 * i for i in range(6)]
     
     # rectify and smooth data
     data_abs=np.abs(data)
@@ -45,10 +49,10 @@ def plot_wav_with_timestamps(wav_path, events_path, event_id="2"):
 
     # find appropriate threshold and find indices where data crosses threshold
     threshold = 0.05*np.max(data)
-    mask = data > threshold
+    crossings = Intervals.from_threshold(data, threshold)
 
     proc_threshold = 0.05*np.max(processed_data)
-    proc_mask = processed_data > proc_threshold
+    proc_crossings = Intervals.from_threshold(processed_data, proc_threshold)
 
     #compute RMS instead of smoothing
     # Choose a window size in samples (e.g. 50 ms window at 1000 Hz -> 50 samples)
@@ -59,18 +63,19 @@ def plot_wav_with_timestamps(wav_path, events_path, event_id="2"):
     
     # Because we computed RMS in a sliding window, we have fewer samples:
     # the length of emg_rms is len(emg_rectified) - window_size + 1
-    # We'll trim the 'force' array and 'time' array to match
-    time_trimmed = time_axis[window_size - 1:]
+    # We'll shift the time base to match
+    rms_timebase = TimeBase(samplerate, len(emg_rms), start=timebase.time(window_size - 1))
 
     force_level = 1
 
     # this creates a mask based on time 
-    # mask = (time_axis >= events_to_plot[0]) & (time_axis <= events_to_plot[1])
+    # mask = timebase.slice(events_to_plot[0], events_to_plot[1])
 
     # plot the EMG waveform
 
     # Create a figure and two subplots in one column (2 rows x 1 column)
     fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(10, 6), sharex=True)
+    time_axis = timebase.axis()  # only needed for plotting
    
     # make a subplot of the original EMG
     ax1.plot(time_axis, data, label='EMG')
@@ -78,9 +83,9 @@ def plot_wav_with_timestamps(wav_path, events_path, event_id="2"):
     #plot a horizontal line at threshold
     ax1.axhline(y=threshold, color="gray", linestyle="--", alpha=0.7)
     
-    #plot a red dot for every threshold crossing
-    ax1.scatter(time_axis[mask], np.ones(np.sum(mask)) * threshold, 
-                s=5, color="red", marker=".", label=f">{threshold:.0f}", zorder=3)
+    #plot a red segment for every interval above threshold
+    plot_intervals(ax1, crossings, timebase, threshold,
+                   color="red", linewidth=3, label=f">{threshold:.0f}", zorder=3)
    
     ax1.set_xlabel('Time (s)')
     ax1.set_ylabel('Amplitude')
@@ -93,14 +98,14 @@ def plot_wav_with_timestamps(wav_path, events_path, event_id="2"):
     
     # make a subplot of the processed EMG
     ax2.plot(time_axis, processed_data, label='processed EMG')
-    # ax2.plot(time_trimmed, emg_rms, label='RMS')
+    # ax2.plot(rms_timebase.axis(), emg_rms, label='RMS')
 
     #plot a horizontal line at threshold
     ax2.axhline(y=proc_threshold, color="gray", linestyle="--", alpha=0.7)
     
-    #plot a red dot for every threshold crossing
-    ax2.scatter(time_axis[proc_mask], np.ones(np.sum(proc_mask)) * proc_threshold, 
-                s=5, color="red", marker=".", label=f">{proc_threshold:.0f}", zorder=3)
+    #plot a red segment for every interval above threshold
+    plot_intervals(ax2, proc_crossings, timebase, proc_threshold,
+                   color="red", linewidth=3, label=f">{proc_threshold:.0f}", zorder=3)
    
     ax2.set_xlabel('Time (s)')
     ax2.set_ylabel('Amplitude')
@@ -170,4 +175,9 @@ if __name__ == "__main__":
             wav_file_path = fr"data\on_off_10sec\on_off_10s_{date}_{subject}.wav"
             if os.path.isfile(wav_file_path):
                 events_file = fr"data\on_off_10sec\on_off_10s_{date}_{subject}_events.txt" 
+                # cheap quality check before the processing and plotting
+                report = quality_report(wav_file_path, events_file)
+                if not report["ok"]:
+                    print(f"Skipping {wav_file_path}: {', '.join(report['problems'])}")
+                    continue
                 plot_wav_with_timestamps(wav_file_path, events_file)
\ No newline at end of file